@@ -1,5 +1,6 @@
 from fastapi import APIRouter, status, HTTPException, Depends
-from database import Session, engine
+from database import get_session
+from sqlalchemy import orm
 from schemas import SignUpModel, LoginModel
 from models import User
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -9,8 +10,6 @@ from fastapi.encoders import jsonable_encoder
 # Create the API router for authentication routes
 auth_router = APIRouter()
 
-session = Session(bind=engine)
-
 
 @auth_router.get("/")
 async def hello(Authorize: AuthJWT = Depends()):
@@ -38,7 +37,7 @@ async def hello(Authorize: AuthJWT = Depends()):
 
 
 @auth_router.post("/signup", status_code=status.HTTP_200_OK)
-async def signup(user: SignUpModel):
+def signup(user: SignUpModel, session: orm.Session = Depends(get_session)):
     """
     ### Signup Endpoint
 
@@ -88,7 +87,11 @@ async def signup(user: SignUpModel):
 
 
 @auth_router.post("/login", status_code=status.HTTP_200_OK)
-async def login(user: LoginModel, Authorize: AuthJWT = Depends()):
+def login(
+    user: LoginModel,
+    Authorize: AuthJWT = Depends(),
+    session: orm.Session = Depends(get_session),
+):
     """
     ### Login Endpoint
 
@@ -0,0 +1,142 @@
+import logging
+import re
+from database import Session, engine
+from models import WorkoutRoutine, Exercise, ExerciseSet
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+MAX_SETS = 20  # Entries claiming more sets than this are treated as typos
+POUNDS_TO_KILOGRAMS = 0.45359237
+
+# Matches entries such as "Bench Press 3x10 @ 60kg" or "Deadlift 1x5 225lbs".
+# Weights without a unit are taken to be kilograms. A comma inside a weight is
+# a thousands separator when followed by groups of three digits ("1,000kg")
+# and a decimal comma otherwise ("60,5kg").
+# Entries are separated by semicolons, new lines, or commas that are not
+# between two digits.
+EXERCISE_PATTERN = re.compile(
+    r"^\s*(?P<name>[A-Za-z][A-Za-z '\-]*?)\s*:?\s*"
+    r"(?P<sets>\d+)\s*[xX]\s*(?P<reps>\d+)"
+    r"(?:\s*(?:@|at)?\s*(?P<weight>\d+(?:[.,]\d+)*)\s*(?P<unit>kgs?|lbs?)?)?\s*$",
+    re.IGNORECASE,
+)
+THOUSANDS_PATTERN = re.compile(r"\d{1,3}(?:,\d{3})+(?:\.\d+)?")
+ENTRY_SEPARATOR = re.compile(r"[;\n]|(?<!\d),|,(?!\d)")
+
+
+def parse_weight(weight):
+    """
+    Converts a weight written with a decimal point, a decimal comma or
+    thousands separators into a number.
+
+    Returns:
+        The weight as a float, or None if it is not a valid number.
+    """
+    if THOUSANDS_PATTERN.fullmatch(weight):
+        weight = weight.replace(",", "")
+    else:
+        weight = weight.replace(",", ".")
+    try:
+        return float(weight)
+    except ValueError:
+        return None
+
+
+def parse_routine_details(routine_details):
+    """
+    Parses free-text routine details into structured exercises.
+
+    Args:
+        routine_details (str): The free-text description of a workout.
+
+    Returns:
+        A list of unsaved `Exercise` objects with weights in kilograms. Entries
+        that do not look like "<name> <sets>x<reps> [@ <weight>[kg|lbs]]", or
+        that have no reps or more than `MAX_SETS` sets, are skipped.
+    """
+    exercises = []
+    for entry in ENTRY_SEPARATOR.split(routine_details or ""):
+        match = EXERCISE_PATTERN.match(entry)
+        if not match:
+            continue
+        name = Exercise.normalize_name(match.group("name"))
+        sets = int(match.group("sets"))
+        reps = int(match.group("reps"))
+        if len(name) > 100 or not 0 < sets <= MAX_SETS or reps == 0:
+            continue
+        weight = parse_weight(match.group("weight") or "0")
+        if weight is None:
+            continue
+        if (match.group("unit") or "").lower().startswith("lb"):
+            weight = round(weight * POUNDS_TO_KILOGRAMS, 2)
+        exercises.append(
+            Exercise(
+                name=name,
+                sets=[
+                    ExerciseSet(set_number=number, reps=reps, weight=weight)
+                    for number in range(1, sets + 1)
+                ],
+            )
+        )
+    return exercises
+
+
+def backfill(batch_size=BATCH_SIZE, user_id=None, cancelled=None, session=None):
+    """
+    Backfills structured exercises for routines that only have free-text details.
+
+    Routines are walked in `routine_id` order in batches of `batch_size`, and
+    each batch is committed separately so the job can be stopped and re-run.
+
+    Args:
+        batch_size (int): Number of routines to load and commit at a time.
+        user_id (int): Only backfill this user's routines, if given.
+        cancelled (callable): Checked between batches; stops early when it returns True.
+        session (Session): Session to use, e.g. a job worker's. A new one is
+            opened and closed if not given.
+
+    Returns:
+        The number of routines that received structured exercises.
+    """
+    owns_session = session is None
+    if owns_session:
+        session = Session(bind=engine)
+    last_routine_id = 0
+    backfilled = 0
+
+    try:
+        while not (cancelled and cancelled()):
+            query = session.query(WorkoutRoutine).filter(
+                WorkoutRoutine.routine_id > last_routine_id,
+                WorkoutRoutine.routine_details.isnot(None),
+                ~WorkoutRoutine.exercises.any(),
+            )
+            if user_id is not None:
+                query = query.filter(WorkoutRoutine.user_id == user_id)
+            routines = query.order_by(WorkoutRoutine.routine_id).limit(batch_size).all()
+            if not routines:
+                break
+
+            for routine in routines:
+                exercises = parse_routine_details(routine.routine_details)
+                if exercises:
+                    routine.exercises = exercises
+                    backfilled += 1
+
+            session.commit()
+            last_routine_id = routines[-1].routine_id
+            logger.info(
+                "Backfilled up to routine %s (%s total)", last_routine_id, backfilled
+            )
+    finally:
+        if owns_session:
+            session.close()
+
+    return backfilled
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    print("Backfilling structured exercises...")
+    print(f"Backfill complete: {backfill()} routines updated.")
@@ -18,3 +18,17 @@ engine = create_engine(
 
 Base = declarative_base()
 Session = sessionmaker()
+
+
+def get_session():
+    """
+    Provides a database session for the duration of a single request.
+
+    Yields:
+        A `Session` bound to the engine, closed once the request is finished.
+    """
+    session = Session(bind=engine)
+    try:
+        yield session
+    finally:
+        session.close()
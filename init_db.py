@@ -1,5 +1,5 @@
 from database import engine, Base
-from models import User, WorkoutRoutine
+from models import User, WorkoutRoutine, Exercise, ExerciseSet, Job
 
 # Debug: Check registered tables
 print("Registered tables:", Base.metadata.tables.keys())
@@ -7,4 +7,10 @@ print("Registered tables:", Base.metadata.tables.keys())
 # Create tables
 print("Creating tables...")
 Base.metadata.create_all(bind=engine)
+
+# create_all skips tables that already exist, including indexes added to them later
+print("Creating missing indexes...")
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
 print("Tables created successfully!")
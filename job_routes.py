@@ -0,0 +1,256 @@
+import json
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi_jwt_auth import AuthJWT
+from models import User, Job
+from schemas import JobModel
+from database import get_session
+from sqlalchemy import orm
+from fastapi.encoders import jsonable_encoder
+from job_runner import job_runner, JOB_HANDLERS, FINISHED_STATUSES
+
+job_router = APIRouter()
+
+
+def get_user_job(session, job_id, username):
+    """
+    Looks up a job owned by the given user.
+
+    Args:
+        session (Session): The request's database session.
+        job_id (int): The ID of the job.
+        username (str): The subject of the current JWT.
+
+    Returns:
+        The `Job` row.
+
+    Raises:
+        HTTPException: 404 if the user or job is not found.
+    """
+    user = session.query(User).filter_by(username=username).first()
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+        )
+
+    job = (
+        session.query(Job).filter(Job.job_id == job_id, Job.user_id == user.id).first()
+    )
+
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Job not found"
+        )
+    return job
+
+
+def job_status(job):
+    return {
+        "job_id": job.job_id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "cancel_requested": job.cancel_requested,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+
+@job_router.post("/", status_code=status.HTTP_202_ACCEPTED)
+def create_job(
+    job: JobModel,
+    Authorize: AuthJWT = Depends(),
+    session: orm.Session = Depends(get_session),
+):
+    """
+    ### Create Job
+
+    Queues a background job for the authenticated user. Supported job types:
+    `rebuild_history` (parse free-text routines into structured exercises) and
+    `export_workouts` (export up to 5000 routines with their exercises).
+
+    Args:
+        job (JobModel): The job to run.
+            Example:
+                {
+                "job_type": "rebuild_history",
+            }
+
+    Returns:
+        A JSON object with the status of the queued job.
+
+    Raises:
+        HTTPException: 400 if the job type is unknown,
+                       401 if token is invalid or missing,
+                       404 if user not found.
+    """
+    try:
+        Authorize.jwt_required()
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or missing token"
+        )
+
+    if job.job_type not in JOB_HANDLERS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown job type. Use one of: {', '.join(JOB_HANDLERS)}.",
+        )
+
+    current_user = Authorize.get_jwt_subject()
+    user = session.query(User).filter_by(username=current_user).first()
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+        )
+
+    new_job = Job(
+        user_id=user.id,
+        job_type=job.job_type,
+        status="queued",
+        attempts=0,
+        max_attempts=job_runner.settings.max_attempts,
+        cancel_requested=False,
+    )
+
+    session.add(new_job)
+    session.commit()
+    job_runner.wake()
+
+    return jsonable_encoder(job_status(new_job))
+
+
+@job_router.get("/{job_id}", status_code=status.HTTP_200_OK)
+def get_job(
+    job_id: int,
+    Authorize: AuthJWT = Depends(),
+    session: orm.Session = Depends(get_session),
+):
+    """
+    ### Get Job Status
+
+    Retrieves the status of a background job owned by the authenticated user.
+
+    Args:
+        job_id (int): The ID of the job.
+
+    Returns:
+        A JSON object with the job status, attempts and last error.
+
+    Raises:
+        HTTPException: 401 if token is invalid or missing,
+                       404 if user or job not found.
+    """
+    try:
+        Authorize.jwt_required()
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or missing token"
+        )
+
+    job = get_user_job(session, job_id, Authorize.get_jwt_subject())
+    return jsonable_encoder(job_status(job))
+
+
+@job_router.get("/{job_id}/result", status_code=status.HTTP_200_OK)
+def get_job_result(
+    job_id: int,
+    Authorize: AuthJWT = Depends(),
+    session: orm.Session = Depends(get_session),
+):
+    """
+    ### Get Job Result
+
+    Retrieves the result of a succeeded background job owned by the authenticated user.
+
+    Args:
+        job_id (int): The ID of the job.
+
+    Returns:
+        The JSON result produced by the job.
+
+    Raises:
+        HTTPException: 401 if token is invalid or missing,
+                       404 if user or job not found,
+                       409 if the job has not succeeded.
+    """
+    try:
+        Authorize.jwt_required()
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or missing token"
+        )
+
+    job = get_user_job(session, job_id, Authorize.get_jwt_subject())
+
+    if job.status != "succeeded":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job has no result, its status is {job.status}.",
+        )
+
+    return json.loads(job.result)
+
+
+@job_router.post("/{job_id}/cancel", status_code=status.HTTP_200_OK)
+def cancel_job(
+    job_id: int,
+    Authorize: AuthJWT = Depends(),
+    session: orm.Session = Depends(get_session),
+):
+    """
+    ### Cancel Job
+
+    Cancels a background job owned by the authenticated user. A queued job is
+    cancelled immediately; a running job stops at its next cancellation check.
+
+    Args:
+        job_id (int): The ID of the job.
+
+    Returns:
+        A JSON object with the updated job status.
+
+    Raises:
+        HTTPException: 401 if token is invalid or missing,
+                       404 if user or job not found,
+                       409 if the job has already finished.
+    """
+    try:
+        Authorize.jwt_required()
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or missing token"
+        )
+
+    job = get_user_job(session, job_id, Authorize.get_jwt_subject())
+
+    # Conditional updates, so a worker claiming the job at the same time either
+    # sees it cancelled or is the one that gets the cancel_requested flag
+    this_job = session.query(Job).filter(Job.job_id == job.job_id)
+    cancelled = this_job.filter(Job.status == "queued").update(
+        {
+            "status": "cancelled",
+            "cancel_requested": True,
+            "finished_at": datetime.utcnow(),
+        },
+        synchronize_session=False,
+    )
+    if not cancelled:
+        flagged = this_job.filter(Job.status.notin_(FINISHED_STATUSES)).update(
+            {"cancel_requested": True}, synchronize_session=False
+        )
+        if not flagged:
+            session.rollback()
+            session.refresh(job)
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Job has already finished, its status is {job.status}.",
+            )
+    session.commit()
+    session.refresh(job)
+
+    return jsonable_encoder(job_status(job))
@@ -0,0 +1,290 @@
+import json
+import os
+import socket
+import threading
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import selectinload
+from database import Session, engine
+from models import Job, WorkoutRoutine, Exercise
+from schemas import JobSettings
+from backfill_exercises import backfill
+from workout_routines import serialize_exercises
+
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+EXPORT_BATCH_SIZE = 500
+EXPORT_MAX_ROUTINES = 5000
+
+
+def rebuild_history(session, user_id, cancelled):
+    """
+    Parses the user's free-text routines into structured exercises.
+
+    Returns:
+        The number of routines that received structured exercises.
+    """
+    backfilled = backfill(user_id=user_id, cancelled=cancelled, session=session)
+    return {"routines_backfilled": backfilled}
+
+
+def export_workouts(session, user_id, cancelled):
+    """
+    Exports the user's workout routines together with their exercises and sets.
+
+    Routines are loaded `EXPORT_BATCH_SIZE` at a time, checking for cancellation
+    between batches, and at most `EXPORT_MAX_ROUTINES` are included so the
+    stored result stays bounded.
+
+    Returns:
+        The routines in the order they were created, and whether the export
+        was truncated.
+    """
+    routines = []
+    last_routine_id = 0
+    while len(routines) < EXPORT_MAX_ROUTINES and not cancelled():
+        batch = (
+            session.query(WorkoutRoutine)
+            .options(selectinload(WorkoutRoutine.exercises).selectinload(Exercise.sets))
+            .filter(
+                WorkoutRoutine.user_id == user_id,
+                WorkoutRoutine.routine_id > last_routine_id,
+            )
+            .order_by(WorkoutRoutine.routine_id)
+            .limit(min(EXPORT_BATCH_SIZE, EXPORT_MAX_ROUTINES - len(routines)))
+            .all()
+        )
+        if not batch:
+            break
+        routines += [
+            {
+                "routine_id": routine.routine_id,
+                "date": routine.date,
+                "routine_details": routine.routine_details,
+                "exercises": serialize_exercises(routine.exercises),
+            }
+            for routine in batch
+        ]
+        last_routine_id = batch[-1].routine_id
+
+    truncated = (
+        len(routines) >= EXPORT_MAX_ROUTINES
+        and session.query(WorkoutRoutine.routine_id)
+        .filter(
+            WorkoutRoutine.user_id == user_id,
+            WorkoutRoutine.routine_id > last_routine_id,
+        )
+        .first()
+        is not None
+    )
+    return {"routines": routines, "truncated": truncated}
+
+
+# Job types that can be submitted, mapped to their handlers. A handler gets the
+# worker's session, the owning user's ID and a `cancelled` callable to poll, and
+# returns a JSON-serializable result. `cancelled` commits the session, so only
+# call it between units of work.
+JOB_HANDLERS = {
+    "rebuild_history": rebuild_history,
+    "export_workouts": export_workouts,
+}
+
+
+class JobRunner:
+    """
+    A bounded pool of worker threads that run jobs from the `job` table.
+
+    Jobs are claimed with `SELECT ... FOR UPDATE SKIP LOCKED` and held under a
+    lease, so several app processes can share the table. Each runner renews
+    the lease of the jobs it is running every `heartbeat_interval` seconds,
+    and any runner requeues running jobs whose lease is older than
+    `lease_timeout`, e.g. because their process died.
+
+    Failed jobs are retried with exponential backoff until `max_attempts` is
+    reached. Cancellation of a running job is cooperative: the handler stops
+    when its `cancelled` callable returns True.
+    """
+
+    def __init__(self, settings=None):
+        self.settings = settings or JobSettings()
+        self.runner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads = []
+        self._active_jobs = set()
+        self._active_lock = threading.Lock()
+
+    def start(self):
+        """Starts the workers and the thread that renews and expires leases."""
+        self._stop.clear()
+        threads = [threading.Thread(target=self._heartbeat, name="job-heartbeat")]
+        threads += [
+            threading.Thread(target=self._work, name=f"job-worker-{number}")
+            for number in range(self.settings.workers)
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=10):
+        """Stops the workers once their current jobs finish."""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def wake(self):
+        """Tells idle workers that a new job is waiting."""
+        self._wake.set()
+
+    def _heartbeat(self):
+        session = Session(bind=engine)
+        try:
+            while True:
+                try:
+                    self._renew_leases(session)
+                    if self._requeue_expired(session):
+                        self.wake()
+                except Exception:
+                    session.rollback()
+                    traceback.print_exc()
+                if self._stop.wait(self.settings.heartbeat_interval):
+                    break
+        finally:
+            session.close()
+
+    def _renew_leases(self, session):
+        with self._active_lock:
+            job_ids = list(self._active_jobs)
+        if job_ids:
+            session.query(Job).filter(
+                Job.job_id.in_(job_ids), Job.claimed_by == self.runner_id
+            ).update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+        session.commit()
+
+    def _requeue_expired(self, session):
+        now = datetime.utcnow()
+        expired = session.query(Job).filter(
+            Job.status == "running",
+            or_(
+                Job.heartbeat_at.is_(None),
+                Job.heartbeat_at < now - timedelta(seconds=self.settings.lease_timeout),
+            ),
+        )
+        finished = {"claimed_by": None, "finished_at": now}
+        expired.filter(Job.cancel_requested.is_(True)).update(
+            {"status": "cancelled", **finished}, synchronize_session=False
+        )
+        expired.filter(Job.attempts >= Job.max_attempts).update(
+            {"status": "failed", "error": "Worker stopped responding", **finished},
+            synchronize_session=False,
+        )
+        requeued = expired.update(
+            {"status": "queued", "claimed_by": None, "run_after": now},
+            synchronize_session=False,
+        )
+        session.commit()
+        return requeued
+
+    def _work(self):
+        session = Session(bind=engine)
+        try:
+            while not self._stop.is_set():
+                try:
+                    job = self._claim(session)
+                    if job is not None:
+                        self._run(session, job)
+                        continue
+                except Exception:
+                    # Keep the worker alive if the database is briefly unavailable.
+                    # A job whose outcome could not be saved stops getting
+                    # heartbeats, so it is requeued once its lease expires.
+                    session.rollback()
+                    traceback.print_exc()
+                self._wake.wait(self.settings.poll_interval)
+                self._wake.clear()
+        finally:
+            session.close()
+
+    def _claim(self, session):
+        job = (
+            session.query(Job)
+            .filter(Job.status == "queued", Job.run_after <= datetime.utcnow())
+            .order_by(Job.run_after, Job.job_id)
+            .with_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            session.rollback()
+            return None
+        job.status = "running"
+        job.attempts += 1
+        job.claimed_by = self.runner_id
+        job.heartbeat_at = datetime.utcnow()
+        session.commit()
+        return job
+
+    def _run(self, session, job):
+        job_id = job.job_id
+        with self._active_lock:
+            self._active_jobs.add(job_id)
+        try:
+            self._execute(session, job)
+        finally:
+            with self._active_lock:
+                self._active_jobs.discard(job_id)
+
+    def _execute(self, session, job):
+        def cancelled():
+            session.refresh(job)
+            cancel_requested = job.cancel_requested
+            # End the transaction so the worker is not left idle in it. Reading
+            # the expired attribute afterwards would start a new one.
+            session.commit()
+            return cancel_requested
+
+        try:
+            result = JOB_HANDLERS[job.job_type](session, job.user_id, cancelled)
+        except Exception:
+            session.rollback()
+            error = traceback.format_exc()
+            if not self._hold_lease(session, job):
+                return
+            job.error = error
+            if job.attempts < job.max_attempts and not job.cancel_requested:
+                backoff = self.settings.retry_backoff * 2 ** (job.attempts - 1)
+                job.status = "queued"
+                job.run_after = datetime.utcnow() + timedelta(seconds=backoff)
+            else:
+                job.status = "cancelled" if job.cancel_requested else "failed"
+                job.finished_at = datetime.utcnow()
+            job.claimed_by = None
+            session.commit()
+            return
+
+        if not self._hold_lease(session, job):
+            return
+        if job.cancel_requested:
+            job.status = "cancelled"
+        else:
+            job.status = "succeeded"
+            job.result = json.dumps(jsonable_encoder(result))
+            job.error = None
+        job.claimed_by = None
+        job.finished_at = datetime.utcnow()
+        session.commit()
+
+    def _hold_lease(self, session, job):
+        # Lock the row, and give up if the lease expired and another runner took over
+        session.refresh(job, with_for_update=True)
+        if job.status == "running" and job.claimed_by == self.runner_id:
+            return True
+        session.rollback()
+        return False
+
+
+job_runner = JobRunner()
@@ -1,6 +1,9 @@
 from fastapi import FastAPI
 from auth_routes import auth_router
 from workout_routines import workout_routine_router
+from rate_limit import RateLimitMiddleware, metrics_router
+from job_routes import job_router
+from job_runner import job_runner
 from fastapi_jwt_auth import AuthJWT
 from schemas import Settings
 import inspect, re
@@ -59,8 +62,21 @@ def custom_openapi():
     return app.openapi_schema
 
 
+@app.on_event("startup")
+def start_job_runner():
+    job_runner.start()
+
+
+@app.on_event("shutdown")
+def stop_job_runner():
+    job_runner.stop()
+
+
 app.openapi = custom_openapi
+app.add_middleware(RateLimitMiddleware)
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(
     workout_routine_router, prefix="/workout_routines", tags=["workout_routines"]
 )
+app.include_router(job_router, prefix="/jobs", tags=["jobs"])
+app.include_router(metrics_router, tags=["metrics"])
@@ -1,6 +1,18 @@
-from sqlalchemy import Column, Integer, String, Text, Date, ForeignKey
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    Text,
+    Date,
+    DateTime,
+    Float,
+    Boolean,
+    ForeignKey,
+    Index,
+)
 from sqlalchemy.orm import relationship
 from database import Base
+from datetime import datetime
 
 
 # User table definition
@@ -19,6 +31,10 @@ class User(Base):
 # WorkoutRoutine table definition
 class WorkoutRoutine(Base):
     __tablename__ = "workout_routine"
+    __table_args__ = (
+        # Analytics filter on a user's routines within a date range
+        Index("ix_workout_routine_user_id_date", "user_id", "date"),
+    )
     routine_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     user_id = Column(
         Integer, ForeignKey("users.id"), index=True
@@ -28,6 +44,88 @@ class WorkoutRoutine(Base):
     user = relationship(
         "User", back_populates="workout_routines"
     )  # Back reference to User table
+    exercises = relationship(
+        "Exercise", back_populates="workout_routine", cascade="all, delete-orphan"
+    )  # Structured exercises performed in this routine
 
     def __repr__(self):
         return f"WorkoutRoutine(routine_id={self.routine_id}, user_id={self.user_id}, date={self.date})"
+
+
+# Exercise table definition
+class Exercise(Base):
+    __tablename__ = "exercise"
+    __table_args__ = (Index("ix_exercise_routine_id_name", "routine_id", "name"),)
+    exercise_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    routine_id = Column(
+        Integer,
+        ForeignKey("workout_routine.routine_id", ondelete="CASCADE"),
+        nullable=False,
+    )  # Foreign key to WorkoutRoutine table
+    name = Column(String(100), nullable=False)
+    workout_routine = relationship(
+        "WorkoutRoutine", back_populates="exercises"
+    )  # Back reference to WorkoutRoutine table
+    sets = relationship(
+        "ExerciseSet",
+        back_populates="exercise",
+        cascade="all, delete-orphan",
+        order_by="ExerciseSet.set_number",
+    )
+
+    @staticmethod
+    def normalize_name(name):
+        # Names are grouped on in analytics, so "Bench  Press" == "bench press"
+        return " ".join(name.split()).lower()
+
+    def __repr__(self):
+        return f"Exercise(exercise_id={self.exercise_id}, routine_id={self.routine_id}, name='{self.name}')"
+
+
+# ExerciseSet table definition
+class ExerciseSet(Base):
+    __tablename__ = "exercise_set"
+    set_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    exercise_id = Column(
+        Integer,
+        ForeignKey("exercise.exercise_id", ondelete="CASCADE"),
+        index=True,
+        nullable=False,
+    )  # Foreign key to Exercise table
+    set_number = Column(Integer, nullable=False)
+    reps = Column(Integer, nullable=False)
+    weight = Column(Float, nullable=False, default=0)  # In kilograms
+    exercise = relationship(
+        "Exercise", back_populates="sets"
+    )  # Back reference to Exercise table
+
+    def __repr__(self):
+        return f"ExerciseSet(set_id={self.set_id}, exercise_id={self.exercise_id}, reps={self.reps}, weight={self.weight})"
+
+
+# Job table definition
+class Job(Base):
+    __tablename__ = "job"
+    __table_args__ = (
+        # Workers claim the oldest runnable job in a given status
+        Index("ix_job_status_run_after", "status", "run_after"),
+    )
+    job_id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    user_id = Column(
+        Integer, ForeignKey("users.id"), index=True
+    )  # Foreign key to User table
+    job_type = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default="queued")
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    result = Column(Text, nullable=True)  # JSON-encoded handler output
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+    claimed_by = Column(String(100), nullable=True)  # Runner holding the lease
+    heartbeat_at = Column(DateTime, nullable=True)  # Lease is renewed while running
+    finished_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"Job(job_id={self.job_id}, user_id={self.user_id}, job_type='{self.job_type}', status='{self.status}')"
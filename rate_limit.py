@@ -0,0 +1,164 @@
+import math
+import time
+from collections import OrderedDict, defaultdict
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi_jwt_auth import AuthJWT
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.routing import Match
+from schemas import RateLimitSettings
+
+metrics_router = APIRouter()
+
+# Counters exposed on /metrics, keyed by route path template
+admitted_requests = defaultdict(int)
+rate_limited_requests = defaultdict(int)
+overloaded_requests = defaultdict(int)
+in_flight_requests = 0
+
+
+class TokenBucket:
+    """
+    A token bucket holding up to `capacity` tokens, refilled at `refill_rate`
+    tokens per second. Each admitted request consumes one token. `clock`
+    returns the current time in seconds.
+    """
+
+    def __init__(self, capacity, refill_rate, clock=time.monotonic):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+        self.updated = now
+
+    def consume(self):
+        """
+        Takes a token from the bucket if one is available.
+
+        Returns:
+            The number of seconds to wait before retrying, or 0 if a token was taken.
+        """
+        self._refill(self.clock())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.refill_rate
+
+
+class RateLimitMiddleware(BaseHTTPMiddleware):
+    """
+    ### Admission Control
+
+    Applies a per-client token bucket to every database-bound route, keyed on the
+    JWT subject (or the client address for unauthenticated requests), and caps
+    the number of database-bound requests in flight across the app. The cap
+    only works because those handlers are plain `def` functions run in the
+    threadpool; an `async def` handler doing blocking I/O would serialize them.
+
+    Rejected requests never reach a route handler:
+        503 when the in-flight cap is reached,
+        429 when the client's bucket for the route is empty.
+    Both carry a `Retry-After` header in seconds. The in-flight cap is checked
+    first, so a request turned away with 503 does not use up a token.
+    """
+
+    def __init__(self, app, settings=None):
+        super().__init__(app)
+        self.settings = settings or RateLimitSettings()
+        self.buckets = OrderedDict()  # Least recently used first
+
+    def _route_path(self, request):
+        # Use the route template so that e.g. every routine ID shares one bucket
+        for route in request.app.routes:
+            match, _ = route.matches(request.scope)
+            if match == Match.FULL:
+                return route.path
+        return None
+
+    def _client_key(self, request):
+        try:
+            subject = AuthJWT(req=request).get_jwt_subject()
+        except Exception:
+            subject = None
+        if subject is not None:
+            return f"user:{subject}"
+
+        header = self.settings.client_ip_header
+        if header and request.headers.get(header):
+            # The last address is the one added by the trusted proxy itself
+            return f"ip:{request.headers[header].split(',')[-1].strip()}"
+        return f"ip:{request.client.host if request.client else 'unknown'}"
+
+    def _bucket(self, client_key, path):
+        key = (client_key, path)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            limit = self.settings.route_limits.get(path, self.settings.default_limit)
+            bucket = TokenBucket(limit.capacity, limit.refill_rate)
+            self.buckets[key] = bucket
+            if len(self.buckets) > self.settings.max_buckets:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket
+
+    async def dispatch(self, request, call_next):
+        global in_flight_requests
+
+        path = self._route_path(request)
+        if path is None or not path.startswith(self.settings.db_bound_prefixes):
+            return await call_next(request)
+
+        if in_flight_requests >= self.settings.max_in_flight:
+            overloaded_requests[path] += 1
+            return JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"detail": "Server is busy, please retry"},
+                headers={"Retry-After": "1"},
+            )
+
+        retry_after = self._bucket(self._client_key(request), path).consume()
+        if retry_after:
+            rate_limited_requests[path] += 1
+            return JSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={"detail": "Too many requests"},
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+        admitted_requests[path] += 1
+        in_flight_requests += 1
+        try:
+            return await call_next(request)
+        finally:
+            in_flight_requests -= 1
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    ### Metrics
+
+    Exposes admission control counters in the Prometheus text format.
+
+    Returns:
+        Admitted, rate limited (429) and overloaded (503) request counts per route,
+        and the number of database-bound requests currently in flight.
+    """
+    lines = []
+    for name, counter in (
+        ("fitness_requests_admitted_total", admitted_requests),
+        ("fitness_requests_rate_limited_total", rate_limited_requests),
+        ("fitness_requests_overloaded_total", overloaded_requests),
+    ):
+        lines.append(f"# TYPE {name} counter")
+        for path, count in sorted(counter.items()):
+            lines.append(f'{name}{{path="{path}"}} {count}')
+    lines.append("# TYPE fitness_requests_in_flight gauge")
+    lines.append(f"fitness_requests_in_flight {in_flight_requests}")
+    return "\n".join(lines) + "\n"
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, conint, confloat, conlist, constr
+from typing import Dict, List, Optional, Tuple
 from datetime import date
 
 
@@ -26,16 +26,69 @@ class Settings(BaseModel):
     )
 
 
+class RouteLimit(BaseModel):
+    capacity: int  # Maximum burst of requests
+    refill_rate: float  # Requests added back to the bucket per second
+
+
+class RateLimitSettings(BaseModel):
+    # Path prefixes whose requests use the database and are admission controlled
+    db_bound_prefixes: Tuple[str, ...] = ("/auth", "/workout_routines", "/jobs")
+    # Keep below the engine's pool (5 + 10 overflow connections by default),
+    # leaving room for the background job workers
+    max_in_flight: int = 12
+    default_limit: RouteLimit = RouteLimit(capacity=60, refill_rate=1.0)
+    route_limits: Dict[str, RouteLimit] = {
+        "/auth/login": RouteLimit(capacity=5, refill_rate=5 / 60),
+        "/auth/signup": RouteLimit(capacity=3, refill_rate=1 / 60),
+    }
+    max_buckets: int = 10000
+    # Header a trusted reverse proxy sets to the client address, e.g.
+    # "X-Forwarded-For" or "X-Real-IP". Without it, unauthenticated requests are
+    # keyed on the connecting address, which behind a proxy is the proxy itself,
+    # so the login and signup limits would be shared by every client.
+    # Only set this when the app cannot be reached except through the proxy.
+    client_ip_header: Optional[str] = None
+
+
+class JobSettings(BaseModel):
+    workers: int = 2
+    poll_interval: float = 1.0  # Seconds an idle worker waits before polling again
+    max_attempts: int = 3
+    retry_backoff: float = 5.0  # Seconds before a retry, doubled on each attempt
+    heartbeat_interval: float = 10.0  # Seconds between lease renewals
+    lease_timeout: float = (
+        60.0  # Running jobs without a heartbeat this long are requeued
+    )
+
+
 class LoginModel(BaseModel):
     username: str
     hashed_password: str
 
 
+class ExerciseSetModel(BaseModel):
+    reps: conint(gt=0)
+    weight: confloat(ge=0) = 0  # In kilograms, zero for bodyweight sets
+
+    class Config:
+        orm_mode = True
+
+
+class ExerciseModel(BaseModel):
+    name: constr(strip_whitespace=True, min_length=1, max_length=100)
+    sets: conlist(ExerciseSetModel, min_items=1)
+
+    class Config:
+        orm_mode = True
+
+
 class WorkoutRoutineModel(BaseModel):
     routine_id: Optional[int] = None
     user_id: Optional[int] = None  # Optional because it's set automatically
     date: date
     routine_details: str
+    exercises: Optional[List[ExerciseModel]] = None  # Structured data for analytics
 
     class Config:
         orm_mode = True
@@ -44,7 +97,17 @@ class WorkoutRoutineModel(BaseModel):
                 "routine_id": 1,
                 "user_id": 123,
                 "date": "2024-12-01",
-                "routine_details": "Morning yoga and cardio workout",
+                "routine_details": "Bench press and squats",
+                "exercises": [
+                    {
+                        "name": "Bench Press",
+                        "sets": [
+                            {"reps": 10, "weight": 60},
+                            {"reps": 8, "weight": 70},
+                        ],
+                    },
+                    {"name": "Squat", "sets": [{"reps": 5, "weight": 100}]},
+                ],
             }
         }
 
@@ -59,3 +122,15 @@ class UpdateWorkoutRoutineDetails(BaseModel):
                 "routine_details": "Morning yoga and cardio workout",
             }
         }
+
+
+class JobModel(BaseModel):
+    job_type: str
+
+    class Config:
+        orm_mode = True
+        schema_extra = {
+            "example": {
+                "job_type": "rebuild_history",
+            }
+        }
@@ -0,0 +1,113 @@
+import pytest
+from backfill_exercises import backfill, parse_routine_details
+from models import User, WorkoutRoutine
+
+
+def parsed(routine_details):
+    return [
+        (exercise.name, [(s.set_number, s.reps, s.weight) for s in exercise.sets])
+        for exercise in parse_routine_details(routine_details)
+    ]
+
+
+def test_parses_sets_reps_and_weight():
+    assert parsed("Bench Press 3x10 @ 60kg") == [
+        ("bench press", [(1, 10, 60.0), (2, 10, 60.0), (3, 10, 60.0)])
+    ]
+
+
+@pytest.mark.parametrize(
+    "routine_details",
+    ["Squat 1x5 100", "Squat 1x5 at 100 kg", "squat: 1X5 100KGS", "SQUAT  1 x 5 @100"],
+)
+def test_accepted_formats(routine_details):
+    assert parsed(routine_details) == [("squat", [(1, 5, 100.0)])]
+
+
+def test_bodyweight_entries_have_zero_weight():
+    assert parsed("Pull Up 2x8") == [("pull up", [(1, 8, 0.0), (2, 8, 0.0)])]
+
+
+def test_pounds_are_converted_to_kilograms():
+    assert parsed("Deadlift 1x5 @ 225lbs") == [("deadlift", [(1, 5, 102.06)])]
+
+
+@pytest.mark.parametrize(
+    "routine_details, weight",
+    [
+        ("Row 1x10 @ 1,000kg", 1000.0),
+        ("Row 1x10 @ 1,000.5kg", 1000.5),
+        ("Row 1x10 @ 60,5kg", 60.5),
+        ("Row 1x10 @ 60.5kg", 60.5),
+    ],
+)
+def test_commas_inside_weights_are_not_entry_separators(routine_details, weight):
+    assert parsed(routine_details) == [("row", [(1, 10, weight)])]
+
+
+def test_entries_are_split_on_separators():
+    routine_details = "Squat 1x5 100,Bench 1x5 60, Row 1x8 40; Curl 1x12 10\nDip 1x10"
+
+    assert [name for name, _ in parsed(routine_details)] == [
+        "squat",
+        "bench",
+        "row",
+        "curl",
+        "dip",
+    ]
+
+
+@pytest.mark.parametrize(
+    "routine_details",
+    [
+        "Morning yoga and cardio",
+        "Squat 100000x5",
+        "Squat 0x5 100",
+        "Squat 3x0 100",
+        "Press 3x5 1,2,3",
+        "",
+        None,
+    ],
+)
+def test_unrecognised_or_implausible_entries_are_skipped(routine_details):
+    assert parsed(routine_details) == []
+
+
+def test_backfill_only_fills_routines_without_exercises(db):
+    user = User(username="maddy", email="maddy@example.com")
+    other = User(username="sam", email="sam@example.com")
+    db.add_all([user, other])
+    db.commit()
+    db.add_all(
+        [
+            WorkoutRoutine(user_id=user.id, routine_details="Squat 2x5 100"),
+            WorkoutRoutine(user_id=user.id, routine_details="Morning yoga"),
+            WorkoutRoutine(user_id=other.id, routine_details="Bench 1x5 60"),
+        ]
+    )
+    db.commit()
+
+    assert backfill(batch_size=1, user_id=user.id, session=db) == 1
+    assert backfill(batch_size=1, user_id=user.id, session=db) == 0
+    assert backfill(session=db) == 1
+
+    routines = db.query(WorkoutRoutine).order_by(WorkoutRoutine.routine_id).all()
+    assert [len(routine.exercises) for routine in routines] == [1, 0, 1]
+    assert [s.weight for s in routines[0].exercises[0].sets] == [100.0, 100.0]
+
+
+def test_backfill_stops_when_cancelled(db):
+    user = User(username="maddy", email="maddy@example.com")
+    db.add(user)
+    db.commit()
+    db.add_all(
+        [WorkoutRoutine(user_id=user.id, routine_details="Squat 1x5") for _ in range(3)]
+    )
+    db.commit()
+    checks = []
+
+    def cancelled():
+        checks.append(1)
+        return len(checks) > 2
+
+    assert backfill(batch_size=1, cancelled=cancelled, session=db) == 2
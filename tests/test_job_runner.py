@@ -0,0 +1,298 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+import job_runner
+from database import Session
+from job_runner import JobRunner
+from models import Job, User, WorkoutRoutine
+from schemas import JobSettings
+
+
+def fail(session, user_id, cancelled):
+    raise ZeroDivisionError("boom")
+
+
+def succeed(session, user_id, cancelled):
+    return {"user_id": user_id}
+
+
+@pytest.fixture
+def user(db):
+    user = User(username="maddy", email="maddy@example.com")
+    db.add(user)
+    db.commit()
+    return user
+
+
+@pytest.fixture
+def runner():
+    return JobRunner(JobSettings(retry_backoff=10, lease_timeout=60))
+
+
+def add_job(db, user, **columns):
+    columns = {
+        "job_type": "export_workouts",
+        "status": "queued",
+        "attempts": 0,
+        "max_attempts": 3,
+        "cancel_requested": False,
+        **columns,
+    }
+    job = Job(user_id=user.id, **columns)
+    db.add(job)
+    db.commit()
+    return job
+
+
+def reload(db, job):
+    db.expire_all()
+    return db.get(Job, job.job_id)
+
+
+def test_claim_skips_jobs_locked_by_another_runner(engine, db, user, runner):
+    first = add_job(db, user)
+    second = add_job(db, user)
+    other = Session(bind=engine)
+    other.query(Job).filter(Job.job_id == first.job_id).with_for_update().one()
+
+    try:
+        claimed = runner._claim(db)
+    finally:
+        other.rollback()
+        other.close()
+
+    assert claimed.job_id == second.job_id
+    assert claimed.status == "running"
+    assert claimed.attempts == 1
+    assert claimed.claimed_by == runner.runner_id
+    assert reload(db, first).status == "queued"
+
+
+def test_claim_ignores_jobs_not_yet_due(db, user, runner):
+    add_job(db, user, run_after=datetime.utcnow() + timedelta(minutes=1))
+
+    assert runner._claim(db) is None
+
+
+def test_failed_jobs_are_retried_with_backoff_until_max_attempts(
+    db, user, runner, monkeypatch
+):
+    monkeypatch.setitem(job_runner.JOB_HANDLERS, "export_workouts", fail)
+    job = add_job(db, user)
+
+    for attempt, backoff in ((1, 10), (2, 20)):
+        start = datetime.utcnow()
+        runner._run(db, runner._claim(db))
+        job = reload(db, job)
+        assert (job.status, job.attempts, job.claimed_by) == ("queued", attempt, None)
+        assert "ZeroDivisionError" in job.error
+        delay = (job.run_after - start).total_seconds()
+        assert backoff <= delay < backoff + 5
+        job.run_after = datetime.utcnow()
+        db.commit()
+
+    runner._run(db, runner._claim(db))
+    job = reload(db, job)
+
+    assert (job.status, job.attempts) == ("failed", 3)
+    assert job.finished_at is not None
+
+
+def test_successful_jobs_store_their_result(db, user, runner, monkeypatch):
+    monkeypatch.setitem(job_runner.JOB_HANDLERS, "export_workouts", succeed)
+    job = add_job(db, user)
+
+    runner._run(db, runner._claim(db))
+    job = reload(db, job)
+
+    assert (job.status, job.claimed_by) == ("succeeded", None)
+    assert json.loads(job.result) == {"user_id": user.id}
+
+
+def test_running_jobs_see_cancellation(engine, db, user, runner, monkeypatch):
+    def wait_for_cancel(session, user_id, cancelled):
+        assert not cancelled()
+        assert not session.in_transaction()  # Not left idle in a transaction
+        other = Session(bind=engine)
+        other.query(Job).filter(Job.job_id == job.job_id).update(
+            {"cancel_requested": True}
+        )
+        other.commit()
+        other.close()
+        assert cancelled()
+        return {}
+
+    monkeypatch.setitem(job_runner.JOB_HANDLERS, "export_workouts", wait_for_cancel)
+    job = add_job(db, user)
+
+    runner._run(db, runner._claim(db))
+
+    assert reload(db, job).status == "cancelled"
+
+
+def test_expired_leases_are_requeued_failed_or_cancelled(db, user, runner):
+    stale = datetime.utcnow() - timedelta(minutes=5)
+    running = {"status": "running", "attempts": 1, "claimed_by": "dead"}
+    requeued = add_job(db, user, heartbeat_at=stale, **running)
+    never_beat = add_job(db, user, heartbeat_at=None, **running)
+    exhausted = add_job(db, user, heartbeat_at=stale, **{**running, "attempts": 3})
+    cancelled = add_job(db, user, heartbeat_at=stale, cancel_requested=True, **running)
+    alive = add_job(db, user, heartbeat_at=datetime.utcnow(), **running)
+
+    assert runner._requeue_expired(db) == 2
+
+    assert [
+        (reload(db, job).status, reload(db, job).claimed_by)
+        for job in (requeued, never_beat, exhausted, cancelled, alive)
+    ] == [
+        ("queued", None),
+        ("queued", None),
+        ("failed", None),
+        ("cancelled", None),
+        ("running", "dead"),
+    ]
+    assert reload(db, exhausted).error == "Worker stopped responding"
+
+
+def test_leases_are_renewed_only_for_the_runners_own_active_jobs(db, user, runner):
+    stale = datetime.utcnow() - timedelta(minutes=5)
+    ours = add_job(db, user, status="running", claimed_by=runner.runner_id)
+    theirs = add_job(db, user, status="running", claimed_by="other")
+    for job in (ours, theirs):
+        job.heartbeat_at = stale
+    db.commit()
+    runner._active_jobs.update({ours.job_id, theirs.job_id})
+
+    runner._renew_leases(db)
+
+    assert reload(db, ours).heartbeat_at > stale
+    assert reload(db, theirs).heartbeat_at == stale
+
+
+def test_outcome_is_not_saved_once_another_runner_took_over(
+    engine, db, user, runner, monkeypatch
+):
+    def taken_over(session, user_id, cancelled):
+        # The lease expired and another runner claimed the job meanwhile
+        other = Session(bind=engine)
+        other.query(Job).filter(Job.job_id == job.job_id).update(
+            {"claimed_by": "other", "attempts": 2}
+        )
+        other.commit()
+        other.close()
+        return {"stale": True}
+
+    monkeypatch.setitem(job_runner.JOB_HANDLERS, "export_workouts", taken_over)
+    job = add_job(db, user)
+
+    runner._run(db, runner._claim(db))
+    job = reload(db, job)
+
+    assert (job.status, job.claimed_by, job.attempts) == ("running", "other", 2)
+    assert job.result is None
+
+
+def test_export_is_paged_and_bounded(db, user, runner, monkeypatch):
+    monkeypatch.setattr(job_runner, "EXPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(job_runner, "EXPORT_MAX_ROUTINES", 3)
+    db.add_all(
+        [WorkoutRoutine(user_id=user.id, routine_details=str(n)) for n in range(4)]
+    )
+    db.commit()
+    checks = []
+
+    def cancelled():
+        checks.append(1)
+        return False
+
+    result = job_runner.export_workouts(db, user.id, cancelled)
+
+    assert [routine["routine_details"] for routine in result["routines"]] == [
+        "0",
+        "1",
+        "2",
+    ]
+    assert result["truncated"] is True
+    assert len(checks) == 2  # Once per batch
+
+
+def test_export_stops_when_cancelled(db, user):
+    db.add(WorkoutRoutine(user_id=user.id, routine_details="Squat 1x5"))
+    db.commit()
+
+    result = job_runner.export_workouts(db, user.id, lambda: True)
+
+    assert result == {"routines": [], "truncated": False}
+
+
+def test_workers_run_queued_jobs(engine, db, user, monkeypatch):
+    monkeypatch.setattr(job_runner, "engine", engine)
+    monkeypatch.setitem(job_runner.JOB_HANDLERS, "export_workouts", succeed)
+    jobs = [add_job(db, user) for _ in range(5)]
+    runner = JobRunner(JobSettings(workers=2, poll_interval=0.05))
+
+    runner.start()
+    try:
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            if all(reload(db, job).status == "succeeded" for job in jobs):
+                break
+            time.sleep(0.05)
+    finally:
+        runner.stop()
+    db.rollback()
+
+    assert [reload(db, job).status for job in jobs] == ["succeeded"] * 5
+
+
+def test_cancel_queued_job(client, db, user, auth_headers):
+    job = add_job(db, user)
+
+    response = client.post(f"/jobs/{job.job_id}/cancel", headers=auth_headers("maddy"))
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+    assert reload(db, job).cancel_requested
+
+
+def test_cancel_finished_job_is_a_conflict(client, db, user, auth_headers):
+    job = add_job(db, user, status="succeeded", result="{}")
+
+    response = client.post(f"/jobs/{job.job_id}/cancel", headers=auth_headers("maddy"))
+
+    assert response.status_code == 409
+    assert not reload(db, job).cancel_requested
+
+
+def test_cancel_racing_a_claim_flags_the_running_job(
+    engine, client, db, user, auth_headers
+):
+    job = add_job(db, user)
+    worker = Session(bind=engine)
+    claimed = (
+        worker.query(Job)
+        .filter(Job.status == "queued")
+        .with_for_update(skip_locked=True)
+        .one()
+    )
+    claimed.status = "running"
+    worker.flush()  # The worker holds the row lock but has not committed
+    responses = []
+    cancel = threading.Thread(
+        target=lambda: responses.append(
+            client.post(f"/jobs/{job.job_id}/cancel", headers=auth_headers("maddy"))
+        )
+    )
+
+    cancel.start()
+    time.sleep(0.3)
+    assert cancel.is_alive()  # Waiting for the worker's lock
+    worker.commit()
+    worker.close()
+    cancel.join(10)
+
+    assert responses[0].status_code == 200
+    assert responses[0].json()["status"] == "running"
+    assert responses[0].json()["cancel_requested"] is True
@@ -0,0 +1,294 @@
+import asyncio
+import math
+import threading
+import time
+import httpx
+import pytest
+from fastapi import FastAPI
+from auth_routes import auth_router
+from database import get_session
+from models import User
+from rate_limit import RateLimitMiddleware, TokenBucket
+from schemas import RateLimitSettings, RouteLimit
+from workout_routines import workout_routine_router
+
+HANDLER_SECONDS = 0.05
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_app(settings):
+    """
+    Builds an app behind the middleware with blocking handlers, like the real
+    database-bound routes, run in the threadpool.
+
+    Returns:
+        The app and a dict tracking the peak number of requests inside handlers.
+    """
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware, settings=settings)
+    concurrency = {"current": 0, "peak": 0, "lock": threading.Lock()}
+
+    @app.get("/workout_routines/slow")
+    def slow():
+        with concurrency["lock"]:
+            concurrency["current"] += 1
+            concurrency["peak"] = max(concurrency["peak"], concurrency["current"])
+        time.sleep(HANDLER_SECONDS)
+        with concurrency["lock"]:
+            concurrency["current"] -= 1
+        return {}
+
+    @app.get("/workout_routines/fast")
+    def fast():
+        return {}
+
+    @app.post("/auth/login")
+    def login():
+        return {}
+
+    return app, concurrency
+
+
+def make_client(app):
+    transport = httpx.ASGITransport(app=app)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+async def timed_get(client, path, headers=None):
+    start = time.perf_counter()
+    response = await client.get(path, headers=headers)
+    return response, time.perf_counter() - start
+
+
+def p99(latencies):
+    # Nearest-rank percentile
+    latencies = sorted(latencies)
+    return latencies[math.ceil(0.99 * len(latencies)) - 1]
+
+
+def statuses(app, requests):
+    """
+    Sends the (method, path, headers) requests one after another.
+
+    Returns:
+        The list of response status codes.
+    """
+
+    async def send():
+        async with make_client(app) as client:
+            return [
+                (await client.request(method, path, headers=headers)).status_code
+                for method, path, headers in requests
+            ]
+
+    return asyncio.run(send())
+
+
+def test_token_bucket_allows_burst_up_to_capacity():
+    bucket = TokenBucket(capacity=3, refill_rate=1.0, clock=FakeClock())
+
+    assert [bucket.consume() for _ in range(3)] == [0, 0, 0]
+    assert bucket.consume() == pytest.approx(1.0)
+
+
+def test_token_bucket_refills_over_time():
+    clock = FakeClock()
+    bucket = TokenBucket(capacity=2, refill_rate=0.5, clock=clock)
+    bucket.consume()
+    bucket.consume()
+
+    clock.now += 1
+    assert bucket.consume() == pytest.approx(1.0)  # Half a token, half to go
+
+    clock.now += 1
+    assert bucket.consume() == 0
+    assert bucket.consume() == pytest.approx(2.0)
+
+
+def test_token_bucket_refill_is_capped_at_capacity():
+    clock = FakeClock()
+    bucket = TokenBucket(capacity=2, refill_rate=1.0, clock=clock)
+
+    clock.now += 3600
+    assert [bucket.consume() for _ in range(2)] == [0, 0]
+    assert bucket.consume() == pytest.approx(1.0)
+
+
+def test_buckets_are_evicted_least_recently_used_first():
+    middleware = RateLimitMiddleware(FastAPI(), RateLimitSettings(max_buckets=2))
+    first = middleware._bucket("user:a", "/workout_routines/")
+    middleware._bucket("user:b", "/workout_routines/")
+    assert middleware._bucket("user:a", "/workout_routines/") is first
+
+    middleware._bucket("user:c", "/workout_routines/")
+
+    assert list(middleware.buckets) == [
+        ("user:a", "/workout_routines/"),
+        ("user:c", "/workout_routines/"),
+    ]
+
+
+def test_buckets_are_keyed_on_jwt_subject(auth_headers):
+    app, _ = make_app(
+        RateLimitSettings(default_limit=RouteLimit(capacity=2, refill_rate=0.001))
+    )
+    alice, bob = auth_headers("alice"), auth_headers("bob")
+
+    codes = statuses(
+        app,
+        [("GET", "/workout_routines/fast", alice)] * 3
+        + [("GET", "/workout_routines/fast", bob)] * 2
+        + [("GET", "/workout_routines/fast", None)] * 3,
+    )
+
+    # Same client address throughout, yet each subject has its own bucket
+    assert codes == [200, 200, 429, 200, 200, 200, 200, 429]
+
+
+def test_invalid_token_falls_back_to_client_address():
+    app, _ = make_app(
+        RateLimitSettings(default_limit=RouteLimit(capacity=1, refill_rate=0.001))
+    )
+    forged = {"Authorization": "Bearer not-a-jwt"}
+
+    codes = statuses(
+        app,
+        [
+            ("GET", "/workout_routines/fast", forged),
+            ("GET", "/workout_routines/fast", None),
+        ],
+    )
+
+    assert codes == [200, 429]
+
+
+def test_login_has_a_stricter_limit_than_other_routes():
+    app, _ = make_app(RateLimitSettings())
+    login_limit = RateLimitSettings().route_limits["/auth/login"].capacity
+
+    codes = statuses(
+        app,
+        [("POST", "/auth/login", None)] * (login_limit + 1)
+        + [("GET", "/workout_routines/fast", None)],
+    )
+
+    assert codes == [200] * login_limit + [429, 200]
+
+
+def test_trusted_proxy_header_separates_clients_behind_a_proxy():
+    app, _ = make_app(RateLimitSettings(client_ip_header="X-Forwarded-For"))
+    login_limit = RateLimitSettings().route_limits["/auth/login"].capacity
+    first = {"X-Forwarded-For": "spoofed, 203.0.113.1"}
+    second = {"X-Forwarded-For": "203.0.113.2"}
+
+    codes = statuses(
+        app,
+        [("POST", "/auth/login", first)] * (login_limit + 1)
+        + [("POST", "/auth/login", second)],
+    )
+
+    assert codes == [200] * login_limit + [429, 200]
+
+
+def test_overloaded_requests_do_not_use_tokens():
+    app, _ = make_app(
+        RateLimitSettings(
+            max_in_flight=1,
+            default_limit=RouteLimit(capacity=2, refill_rate=0.001),
+        )
+    )
+
+    async def send():
+        async with make_client(app) as client:
+            blocking = asyncio.ensure_future(client.get("/workout_routines/slow"))
+            await asyncio.sleep(HANDLER_SECONDS / 5)
+            rejected = [await client.get("/workout_routines/slow") for _ in range(5)]
+            await blocking
+            after = [await client.get("/workout_routines/slow") for _ in range(2)]
+            return rejected, after
+
+    rejected, after = asyncio.run(send())
+
+    assert [response.status_code for response in rejected] == [503] * 5
+    assert all(response.headers["Retry-After"] == "1" for response in rejected)
+    # The slow request took one of the two tokens; the 503s took none
+    assert [response.status_code for response in after] == [200, 429]
+
+
+def test_flood_is_shed_and_admitted_latency_stays_bounded():
+    max_in_flight = 8
+    app, concurrency = make_app(
+        RateLimitSettings(
+            max_in_flight=max_in_flight,
+            default_limit=RouteLimit(capacity=40, refill_rate=0.5),
+        )
+    )
+
+    async def flood():
+        async with make_client(app) as client:
+            results = []
+            # Waves of far more concurrent requests than the in-flight cap
+            for _ in range(10):
+                results += await asyncio.gather(
+                    *[timed_get(client, "/workout_routines/slow") for _ in range(50)]
+                )
+            return results
+
+    results = asyncio.run(flood())
+    codes = [response.status_code for response, _ in results]
+
+    assert codes.count(200) <= 40  # Never more than the bucket allows
+    assert codes.count(503) > 0
+    assert codes.count(429) > 0
+    # Blocking handlers ran side by side, up to but never beyond the cap
+    assert 1 < concurrency["peak"] <= max_in_flight
+
+    for response, _ in results:
+        if response.status_code in (429, 503):
+            assert int(response.headers["Retry-After"]) >= 1
+
+    admitted = [elapsed for response, elapsed in results if response.status_code == 200]
+    assert p99(admitted) < HANDLER_SECONDS + 0.5
+
+
+def test_flood_of_database_routes_is_shed(db, get_test_session, auth_headers):
+    db.add(User(username="maddy", email="maddy@example.com"))
+    db.commit()
+
+    app = FastAPI()
+    app.add_middleware(
+        RateLimitMiddleware,
+        settings=RateLimitSettings(
+            max_in_flight=2,
+            default_limit=RouteLimit(capacity=1000, refill_rate=1000),
+        ),
+    )
+    app.include_router(auth_router, prefix="/auth")
+    app.include_router(workout_routine_router, prefix="/workout_routines")
+    app.dependency_overrides[get_session] = get_test_session
+    headers = auth_headers("maddy")
+
+    async def flood():
+        async with make_client(app) as client:
+            return await asyncio.gather(
+                *[
+                    timed_get(client, "/workout_routines/showallworkouts", headers)
+                    for _ in range(200)
+                ]
+            )
+
+    results = asyncio.run(flood())
+    codes = [response.status_code for response, _ in results]
+
+    # Handlers overlap in the threadpool, so the in-flight cap is reached
+    assert codes.count(503) > 0
+    assert codes.count(201) > 0  # The route's declared status code
+    admitted = [elapsed for response, elapsed in results if response.status_code == 201]
+    assert p99(admitted) < 2
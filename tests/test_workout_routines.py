@@ -0,0 +1,197 @@
+import pytest
+from models import Exercise, User, WorkoutRoutine
+
+
+@pytest.fixture
+def maddy(db, auth_headers):
+    db.add(User(username="maddy", email="maddy@example.com"))
+    db.commit()
+    return auth_headers("maddy")
+
+
+@pytest.fixture
+def sam(db, auth_headers):
+    db.add(User(username="sam", email="sam@example.com"))
+    db.commit()
+    return auth_headers("sam")
+
+
+def create_workout(client, headers, date, exercises=None, routine_details="Lifting"):
+    payload = {"date": date, "routine_details": routine_details}
+    if exercises is not None:
+        payload["exercises"] = exercises
+    response = client.post(
+        "/workout_routines/createworkout", json=payload, headers=headers
+    )
+    assert response.status_code == 201
+    return response.json()
+
+
+def analytics(client, headers, start_date, end_date):
+    return client.get(
+        "/workout_routines/analytics",
+        params={"start_date": start_date, "end_date": end_date},
+        headers=headers,
+    )
+
+
+def test_create_returns_the_stored_exercises(client, maddy):
+    created = create_workout(
+        client,
+        maddy,
+        "2024-01-01",
+        [{"name": "  Bench   Press ", "sets": [{"reps": 10, "weight": 60}]}],
+    )
+
+    assert created["Exercises"] == [
+        {"name": "bench press", "sets": [{"reps": 10, "weight": 60.0}]}
+    ]
+
+
+@pytest.mark.parametrize(
+    "exercise",
+    [
+        {"name": "", "sets": [{"reps": 1}]},
+        {"name": "x" * 101, "sets": [{"reps": 1}]},
+        {"name": "Squat", "sets": []},
+        {"name": "Squat", "sets": [{"reps": 0}]},
+        {"name": "Squat", "sets": [{"reps": 5, "weight": -1}]},
+    ],
+)
+def test_invalid_exercises_are_rejected(client, maddy, exercise):
+    response = client.post(
+        "/workout_routines/createworkout",
+        json={"date": "2024-01-01", "routine_details": "x", "exercises": [exercise]},
+        headers=maddy,
+    )
+
+    assert response.status_code == 422
+
+
+def test_analytics_aggregates_volume_and_records_per_exercise(client, maddy, sam):
+    create_workout(
+        client,
+        maddy,
+        "2024-01-01",
+        [
+            {
+                "name": "Bench Press",
+                "sets": [{"reps": 10, "weight": 60}, {"reps": 8, "weight": 70}],
+            },
+            {"name": "Squat", "sets": [{"reps": 5, "weight": 100}]},
+        ],
+    )
+    create_workout(
+        client,
+        maddy,
+        "2024-01-05",
+        [{"name": "bench press", "sets": [{"reps": 5, "weight": 80}]}],
+    )
+    # Outside the range, and another user's workout
+    create_workout(
+        client,
+        maddy,
+        "2024-02-01",
+        [{"name": "Squat", "sets": [{"reps": 1, "weight": 200}]}],
+    )
+    create_workout(
+        client,
+        sam,
+        "2024-01-02",
+        [{"name": "Squat", "sets": [{"reps": 1, "weight": 300}]}],
+    )
+
+    response = analytics(client, maddy, "2024-01-01", "2024-01-31")
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {
+            "exercise": "bench press",
+            "total_sets": 3,
+            "total_reps": 23,
+            "total_volume": 1560.0,
+            "personal_record": 80.0,
+        },
+        {
+            "exercise": "squat",
+            "total_sets": 1,
+            "total_reps": 5,
+            "total_volume": 500.0,
+            "personal_record": 100.0,
+        },
+    ]
+
+
+@pytest.mark.parametrize(
+    "start_date, end_date",
+    [("2024-13-01", "2024-12-31"), ("2024-02-01", "2024-01-01")],
+)
+def test_analytics_rejects_invalid_ranges(client, maddy, start_date, end_date):
+    assert analytics(client, maddy, start_date, end_date).status_code == 400
+
+
+def test_put_cannot_update_another_users_routine(client, maddy, sam):
+    created = create_workout(
+        client, maddy, "2024-01-01", [{"name": "Squat", "sets": [{"reps": 5}]}]
+    )
+
+    response = client.put(
+        f"/workout_routines/updateworkouts/{created['Routine_id']}",
+        json={"date": "2024-01-01", "routine_details": "x", "exercises": []},
+        headers=sam,
+    )
+
+    assert response.status_code == 403
+
+
+def routine_exercises(db, routine_id):
+    db.expire_all()
+    return [
+        exercise.name
+        for exercise in db.query(Exercise).filter(Exercise.routine_id == routine_id)
+    ]
+
+
+def test_put_keeps_exercises_when_details_are_unchanged(client, db, maddy):
+    created = create_workout(
+        client, maddy, "2024-01-01", [{"name": "Squat", "sets": [{"reps": 5}]}]
+    )
+
+    client.put(
+        f"/workout_routines/updateworkouts/{created['Routine_id']}",
+        json={"date": "2024-01-02", "routine_details": "Lifting"},
+        headers=maddy,
+    )
+
+    assert routine_exercises(db, created["Routine_id"]) == ["squat"]
+
+
+def test_put_clears_exercises_derived_from_old_details(client, db, maddy):
+    created = create_workout(
+        client, maddy, "2024-01-01", [{"name": "Squat", "sets": [{"reps": 5}]}]
+    )
+
+    client.put(
+        f"/workout_routines/updateworkouts/{created['Routine_id']}",
+        json={"date": "2024-01-01", "routine_details": "Bench 1x5 60"},
+        headers=maddy,
+    )
+
+    assert routine_exercises(db, created["Routine_id"]) == []
+
+
+def test_patch_clears_exercises_derived_from_old_details(client, db, maddy):
+    created = create_workout(
+        client, maddy, "2024-01-01", [{"name": "Squat", "sets": [{"reps": 5}]}]
+    )
+
+    response = client.patch(
+        f"/workout_routines/update_workout_details/{created['Routine_id']}",
+        json={"routine_details": "Bench 1x5 60"},
+        headers=maddy,
+    )
+
+    assert response.status_code == 200
+    assert routine_exercises(db, created["Routine_id"]) == []
+    routine = db.get(WorkoutRoutine, created["Routine_id"])
+    assert routine.routine_details == "Bench 1x5 60"
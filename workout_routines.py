@@ -1,14 +1,55 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi_jwt_auth import AuthJWT
-from models import User, WorkoutRoutine
+from models import User, WorkoutRoutine, Exercise, ExerciseSet
 from schemas import WorkoutRoutineModel, UpdateWorkoutRoutineDetails
-from database import Session, engine
+from database import get_session
+from sqlalchemy import orm
 from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func
 from datetime import datetime
 
 workout_routine_router = APIRouter()
 
-session = Session(bind=engine)
+
+def build_exercises(exercises):
+    """
+    Converts structured exercise payloads into `Exercise` rows with their sets.
+
+    Args:
+        exercises (list): `ExerciseModel` instances to convert.
+
+    Returns:
+        A list of unsaved `Exercise` objects, ready to attach to a routine.
+    """
+    return [
+        Exercise(
+            name=Exercise.normalize_name(exercise.name),
+            sets=[
+                ExerciseSet(set_number=number, reps=s.reps, weight=s.weight)
+                for number, s in enumerate(exercise.sets, start=1)
+            ],
+        )
+        for exercise in exercises
+    ]
+
+
+def serialize_exercises(exercises):
+    """
+    Converts stored `Exercise` rows into the structure accepted by `ExerciseModel`.
+
+    Args:
+        exercises (list): `Exercise` rows with their sets loaded.
+
+    Returns:
+        A list of dictionaries with each exercise's name and sets.
+    """
+    return [
+        {
+            "name": exercise.name,
+            "sets": [{"reps": s.reps, "weight": s.weight} for s in exercise.sets],
+        }
+        for exercise in exercises
+    ]
 
 
 @workout_routine_router.get("/")
@@ -30,8 +71,10 @@ async def hello(Authorize: AuthJWT = Depends()):
 
 
 @workout_routine_router.post("/createworkout", status_code=status.HTTP_201_CREATED)
-async def create_workout_routine(
-    workout_routine: WorkoutRoutineModel, Authorize: AuthJWT = Depends()
+def create_workout_routine(
+    workout_routine: WorkoutRoutineModel,
+    Authorize: AuthJWT = Depends(),
+    session: orm.Session = Depends(get_session),
 ):
     """
     ### Create Workout Routines
@@ -45,7 +88,10 @@ async def create_workout_routine(
                 "routine_id": 1,
                 "user_id": 123,
                 "date": "2024-12-01",
-                "routine_details": "Morning yoga and cardio workout",
+                "routine_details": "Bench press and squats",
+                "exercises": [
+                    {"name": "Bench Press", "sets": [{"reps": 10, "weight": 60}]}
+                ],
             }
 
     Returns:
@@ -71,6 +117,8 @@ async def create_workout_routine(
         routine_details=workout_routine.routine_details,
         user_id=user.id,
     )
+    if workout_routine.exercises:
+        new_workout_routine.exercises = build_exercises(workout_routine.exercises)
 
     session.add(new_workout_routine)
     session.commit()
@@ -80,13 +128,16 @@ async def create_workout_routine(
         "Routine": new_workout_routine.routine_details,
         "Routine_id": new_workout_routine.routine_id,
         "User_id": new_workout_routine.user_id,
+        "Exercises": serialize_exercises(new_workout_routine.exercises),
     }
 
     return jsonable_encoder(response)
 
 
 @workout_routine_router.get("/showallworkouts", status_code=status.HTTP_201_CREATED)
-async def show_all_workouts(Authorize: AuthJWT = Depends()):
+def show_all_workouts(
+    Authorize: AuthJWT = Depends(), session: orm.Session = Depends(get_session)
+):
     """
     ### Show All Workouts
 
@@ -118,7 +169,11 @@ async def show_all_workouts(Authorize: AuthJWT = Depends()):
 @workout_routine_router.get(
     "/showallworkouts/{routine_id}", status_code=status.HTTP_201_CREATED
 )
-async def show_all_workouts(routine_id: int, Authorize: AuthJWT = Depends()):
+def show_all_workouts(
+    routine_id: int,
+    Authorize: AuthJWT = Depends(),
+    session: orm.Session = Depends(get_session),
+):
     """
     ### Show Workouts by Routine ID
 
@@ -165,15 +220,18 @@ async def show_all_workouts(routine_id: int, Authorize: AuthJWT = Depends()):
 @workout_routine_router.put(
     "/updateworkouts/{routine_id}", status_code=status.HTTP_200_OK
 )
-async def update_workout_routine(
+def update_workout_routine(
     routine_id: int,
     workout_routine: WorkoutRoutineModel,
     Authorize: AuthJWT = Depends(),
+    session: orm.Session = Depends(get_session),
 ):
     """
     ### Update Workout Routine
 
     Updates a specific workout routine by its routine ID with the provided new data.
+    When `exercises` is omitted and `routine_details` changes, the routine's
+    structured exercises are cleared so the backfill can derive them again.
 
     Args:
         routine_id (int): The ID of the workout routine to update.
@@ -191,7 +249,8 @@ async def update_workout_routine(
         A JSON-encoded dictionary of the updated workout routine.
 
     Raises:
-        HTTPException: 401 if token is invalid or missing.
+        HTTPException: 401 if token is invalid or missing,
+                       403 if the user is not authorized to update the routine.
     """
     try:
         Authorize.jwt_required()
@@ -200,6 +259,9 @@ async def update_workout_routine(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or missing token"
         )
 
+    username = Authorize.get_jwt_subject()
+    current_user = session.query(User).filter(User.username == username).first()
+
     workout_routine_to_update = (
         session.query(WorkoutRoutine)
         .filter(WorkoutRoutine.routine_id == routine_id)
@@ -207,14 +269,33 @@ async def update_workout_routine(
     )
 
     if workout_routine_to_update:
+        if workout_routine_to_update.user_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Unauthorized to update this routine",
+            )
+        details_changed = (
+            workout_routine_to_update.routine_details != workout_routine.routine_details
+        )
         workout_routine_to_update.date = workout_routine.date
         workout_routine_to_update.routine_details = workout_routine.routine_details
+        if workout_routine.exercises is not None:
+            workout_routine_to_update.exercises = build_exercises(
+                workout_routine.exercises
+            )
+        elif details_changed:
+            # Drop exercises derived from the old text so the backfill can redo them
+            workout_routine_to_update.exercises = []
         session.commit()
     return jsonable_encoder(workout_routine_to_update)
 
 
 @workout_routine_router.get("/filterworkoutsbydate", status_code=status.HTTP_200_OK)
-async def filter_workouts_by_date(date: str, Authorize: AuthJWT = Depends()):
+def filter_workouts_by_date(
+    date: str,
+    Authorize: AuthJWT = Depends(),
+    session: orm.Session = Depends(get_session),
+):
     """
     ### Filter Workouts by Date
 
@@ -269,18 +350,111 @@ async def filter_workouts_by_date(date: str, Authorize: AuthJWT = Depends()):
     return jsonable_encoder(workout_routines)
 
 
+@workout_routine_router.get("/analytics", status_code=status.HTTP_200_OK)
+def workout_analytics(
+    start_date: str,
+    end_date: str,
+    Authorize: AuthJWT = Depends(),
+    session: orm.Session = Depends(get_session),
+):
+    """
+    ### Workout Analytics
+
+    Computes per-exercise volume and personal records for the current authenticated
+    user over a date range. Aggregation runs in the database over the structured
+    exercise data, so free-text routines only count once they have been backfilled.
+
+    Args:
+        start_date (str): First date of the range in YYYY-MM-DD format (query parameter).
+        end_date (str): Last date of the range in YYYY-MM-DD format (query parameter).
+
+    Returns:
+        A list of per-exercise statistics: total sets, total reps, total volume
+        (reps x weight) and the personal record (heaviest weight lifted).
+
+    Raises:
+        HTTPException: 400 if a date is in an invalid format or the range is reversed,
+                       401 if token is invalid or missing,
+                       404 if user not found.
+    """
+    try:
+        Authorize.jwt_required()
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid or missing token"
+        )
+
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid date format. Use YYYY-MM-DD.",
+        )
+
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start_date must not be after end_date.",
+        )
+
+    current_user = Authorize.get_jwt_subject()
+    user = session.query(User).filter_by(username=current_user).first()
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+        )
+
+    rows = (
+        session.query(
+            Exercise.name,
+            func.count(ExerciseSet.set_id),
+            func.sum(ExerciseSet.reps),
+            func.sum(ExerciseSet.reps * ExerciseSet.weight),
+            func.max(ExerciseSet.weight),
+        )
+        .join(WorkoutRoutine, Exercise.routine_id == WorkoutRoutine.routine_id)
+        .join(ExerciseSet, ExerciseSet.exercise_id == Exercise.exercise_id)
+        .filter(
+            WorkoutRoutine.user_id == user.id,
+            WorkoutRoutine.date.between(start, end),
+        )
+        .group_by(Exercise.name)
+        .order_by(Exercise.name)
+        .all()
+    )
+
+    response = [
+        {
+            "exercise": name,
+            "total_sets": total_sets,
+            "total_reps": total_reps,
+            "total_volume": total_volume,
+            "personal_record": personal_record,
+        }
+        for name, total_sets, total_reps, total_volume, personal_record in rows
+    ]
+
+    return jsonable_encoder(response)
+
+
 @workout_routine_router.patch(
     "/update_workout_details/{routine_id}", status_code=status.HTTP_200_OK
 )
-async def update_workout_details(
+def update_workout_details(
     routine_id: int,
     update_details: UpdateWorkoutRoutineDetails,
     Authorize: AuthJWT = Depends(),
+    session: orm.Session = Depends(get_session),
 ):
     """
     ### Partially Update Workout Details
 
     Partially updates the routine details for a given workout routine (by its ID).
+    When the details change, the routine's structured exercises are cleared so
+    the backfill can derive them again.
 
     Args:
         routine_id (int): The ID of the workout routine to update.
@@ -327,6 +501,9 @@ async def update_workout_details(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Unauthorized to update this routine",
         )
+    if workout_routine_to_be_updated.routine_details != update_details.routine_details:
+        # Drop exercises derived from the old text so the backfill can redo them
+        workout_routine_to_be_updated.exercises = []
     workout_routine_to_be_updated.routine_details = update_details.routine_details
     session.commit()
     response_dict = {
@@ -341,7 +518,11 @@ async def update_workout_details(
 @workout_routine_router.delete(
     "/delete_routine/{routine_id}", status_code=status.HTTP_204_NO_CONTENT
 )
-async def delete_workout_routine(routine_id: int, Authorize: AuthJWT = Depends()):
+def delete_workout_routine(
+    routine_id: int,
+    Authorize: AuthJWT = Depends(),
+    session: orm.Session = Depends(get_session),
+):
     """
     ### Delete Workout Routine
 